@@ -0,0 +1,169 @@
+"""On-disk caches: model answers keyed by the exact request, and redacted
+history lines.
+
+Answers are only cached for deterministic requests (temperature 0), so a hit
+is what the API would have returned anyway. Entries are single JSON files
+written atomically, which keeps concurrent clihelper processes safe without
+locking. A file's mtime is its last use: hits refresh it, and eviction drops
+expired entries first and then the least recently used ones.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "clihelper" / "responses"
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES = 1000
+MAX_BYTES = 10 * 1024 * 1024
+
+MEMO_FILE = CACHE_DIR.parent / "redacted_lines.json"
+MEMO_MAX_ENTRIES = 512
+
+
+def cache_key(prompt, model, max_tokens, temperature):
+    """Return the cache key for one API request."""
+    request = json.dumps([prompt, model, max_tokens, temperature])
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory=CACHE_DIR, ttl=TTL_SECONDS,
+                 max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def get(self, key):
+        """Return the cached answer for `key`, or None."""
+        path = self.directory / f"{key}.json"
+        try:
+            entry = json.loads(path.read_text())
+            if time.time() - entry["created"] > self.ttl:
+                path.unlink()
+                return None
+            os.utime(path)
+            return entry["response"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def put(self, key, response):
+        """Store `response` under `key`, then enforce the size limits."""
+        try:
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"created": time.time(), "response": response}, f)
+                os.replace(tmp, self.directory / f"{key}.json")
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over the caps."""
+        entries = []
+        now = time.time()
+        for item in os.scandir(self.directory):
+            if not item.name.endswith(".json"):
+                continue
+            try:
+                st = item.stat()
+            except OSError:
+                continue
+            # Unused for longer than the TTL means created longer ago, too
+            if now - st.st_mtime > self.ttl:
+                self._remove(item.path)
+            else:
+                entries.append((st.st_mtime, st.st_size, item.path))
+
+        entries.sort(reverse=True)
+        total = 0
+        for count, (_, size, path) in enumerate(entries, 1):
+            total += size
+            if count > self.max_entries or total > self.max_bytes:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class RedactionMemo:
+    """Redacted history lines, keyed by a hash of the line and rule-set version.
+
+    The whole memo is one small JSON object kept in least-recently-used
+    order; it is loaded on first use and written back (atomically) only when
+    something changed. Entries for an old rule-set version just stop being
+    hit and age out.
+    """
+
+    def __init__(self, path=MEMO_FILE, max_entries=MEMO_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()  # shared by the daemon's handler threads
+
+    @staticmethod
+    def key(line, version):
+        return hashlib.sha256(f"{version}\0{line}".encode()).hexdigest()
+
+    def get(self, key):
+        """Return the redacted line stored under `key`, or None."""
+        with self._lock:
+            entries = self._load()
+            value = entries.pop(key, None)
+            if value is not None:
+                # Not marked dirty: a run with only hits evicts nothing, so
+                # the new order can wait for the next put to be written
+                entries[key] = value
+            return value
+
+    def put(self, key, redacted):
+        with self._lock:
+            entries = self._load()
+            entries.pop(key, None)
+            entries[key] = redacted
+            while len(entries) > self.max_entries:
+                del entries[next(iter(entries))]
+            self._dirty = True
+
+    def save(self):
+        """Write the memo back if it changed since it was loaded."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        json.dump(self._entries, f)
+                    os.replace(tmp, self.path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+                self._dirty = False
+            except OSError:
+                pass
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                entries = json.loads(self.path.read_text())
+                self._entries = entries if isinstance(entries, dict) else {}
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
@@ -0,0 +1,142 @@
+"""Optional resident CLIHelper daemon and its thin Unix-socket client.
+
+`clihelper daemon` keeps one CLIHelper alive (API key, warm Anthropic client,
+cached history) and answers requests from regular `clihelper` runs over a
+Unix domain socket. When no daemon is listening, or one stops answering, the
+client returns None and the caller falls back to the in-process path.
+"""
+
+import base64
+import copy
+import json
+import os
+import socket
+import socketserver
+import sys
+from pathlib import Path
+
+from . import redact
+from .timings import Timings
+
+SOCKET_PATH = Path.home() / ".clihelper.sock"
+
+# Seconds to wait for the daemon to accept, and then for each message; past
+# either the daemon counts as not running
+CONNECT_TIMEOUT = 1
+REPLY_TIMEOUT = float(os.getenv("CLIHELPER_DAEMON_TIMEOUT", 30))
+
+
+def request(payload, on_text=None, socket_path=SOCKET_PATH, timeout=REPLY_TIMEOUT):
+    """Send a request to the daemon and return its reply, or None if unavailable.
+
+    The daemon answers with one JSON object per line: zero or more
+    {"text": delta} messages followed by the final reply. None is also
+    returned if it goes `timeout` seconds without sending anything, even
+    after some text was passed to `on_text`.
+    """
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except (AttributeError, OSError):
+        return None
+
+    if isinstance(payload.get("stdin"), bytes):
+        # Raw command output; JSON has no bytes type
+        payload = dict(payload, stdin=base64.b64encode(payload["stdin"]).decode(),
+                       stdin_encoding="base64")
+
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(str(socket_path))
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+
+        with sock.makefile("rb") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if "text" not in reply:
+                    return reply
+                if on_text:
+                    on_text(reply["text"])
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+    return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            payload = json.loads(self.rfile.read())
+            # Per-request view sharing the warm client and caches
+            helper = copy.copy(self.server.helper)
+            helper.cache_mode = payload.get("cache", "use")
+            helper.timings = Timings()
+            helper.redaction_stats = (redact.RedactionStats()
+                                      if payload.get("redaction_stats") else None)
+            if payload.get("mode") == "ping":
+                result = "pong"
+            elif payload.get("mode") == "error":
+                stdin = payload.get("stdin", "")
+                if payload.get("stdin_encoding") == "base64":
+                    stdin = base64.b64decode(stdin)
+                result = helper.analyze_error(stdin,
+                                              payload.get("context", ""),
+                                              self.send_text)
+            else:
+                result = helper.analyze_direct_query(payload.get("query", ""),
+                                                     self.send_text)
+            reply = {"result": result, "timings": helper.timings.phases,
+                     "timings_extra": helper.timings.extra}
+        except Exception as e:
+            reply = {"error": str(e)}
+        self.send(reply)
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+    def send_text(self, text):
+        self.send({"text": text})
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=SOCKET_PATH):
+    """Run the daemon in the foreground until interrupted."""
+    from .cli import CLIHelper
+
+    if socket_path.exists():
+        if request({"mode": "ping"}, socket_path=socket_path) is not None:
+            print(f"CLIHelper daemon already running on {socket_path}")
+            return
+        socket_path.unlink()
+
+    # Requests are handled on threads, which redaction must not fork from
+    redact.use_forkserver()
+    helper = CLIHelper()
+    helper.get_client()
+
+    old_umask = os.umask(0o177)
+    try:
+        server = _Server(str(socket_path), _Handler)
+    finally:
+        os.umask(old_umask)
+    server.helper = helper
+
+    print(f"🚀 CLIHelper daemon listening on {socket_path} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        helper.close()
+        try:
+            socket_path.unlink()
+        except OSError:
+            pass
+        print("\nCLIHelper daemon stopped.", file=sys.stderr)
@@ -0,0 +1,178 @@
+"""Regex engine selection for redaction rules.
+
+Redaction runs over untrusted, arbitrarily large input, and Python's `re`
+gives no worst-case guarantee. When the optional `google-re2` package is
+installed, rules are compiled with RE2 instead, which matches in linear time.
+CLIHELPER_REGEX_ENGINE picks the engine: "auto" (default, RE2 if available),
+"re2" or "re".
+
+Rules RE2 can't compile (lookarounds, backreferences in the pattern) fall back
+to `re` one by one. Replacement templates such as r'\\1REDACTED' are turned
+into plain functions for RE2 rules, so they behave the same on both engines.
+
+RE2's \\s, \\w and \\d are ASCII-only, while re's match any Unicode space,
+letter or digit in str patterns (and \\s also matches \\v in bytes ones). They
+are spelled out as explicit classes for RE2; a str pattern using \\b or \\B,
+which RE2 can't make Unicode-aware, stays on re.
+"""
+
+import os
+import re
+
+ENGINE = os.getenv("CLIHELPER_REGEX_ENGINE", "auto").lower()
+
+_re2 = None
+
+
+def _load_re2():
+    global _re2
+    if _re2 is None:
+        try:
+            import re2
+        except ImportError:
+            re2 = False
+        _re2 = re2
+    return _re2 or None
+
+
+def available():
+    """Return the engine names that can be used in this environment."""
+    return ["re", "re2"] if _load_re2() else ["re"]
+
+
+# \1, \g<1> or \g<name> in a replacement template, or another escape
+_TEMPLATE_ESCAPE = re.compile(r'\\(?:(\d{1,2})|g<(\w+)>|(.))', re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "f": "\f", "v": "\v", "a": "\a", "b": "\b", "\\": "\\"}
+
+
+# What re's \s, \w and \d match, spelled out for RE2. re's classes come from
+# Python's Unicode database and RE2's \p{...} from its own, which may be
+# newer; the difference is only in code points Python has unassigned.
+_CLASSES = {
+    str: {
+        "s": r"\t\n\x0b\x0c\r\x1c-\x1f \x{85}\x{a0}\x{1680}\x{2000}-\x{200a}"
+             r"\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}",
+        "w": r"\p{L}\p{N}_",
+        "d": r"\p{Nd}",
+    },
+    # bytes \w, \d and \b are ASCII on both engines
+    bytes: {"s": r"\t\n\x0b\x0c\r "},
+}
+
+# An escape, the opening of a character class or any other character
+_SYNTAX = re.compile(r'\\(.)|(\[\^?\]?)|(.)', re.DOTALL)
+
+
+def re2_source(source):
+    """Return `source` with \\s, \\w and \\d (and \\S, \\W, \\D) spelled out for RE2.
+
+    Raises ValueError if RE2 can't match the same text: a \\b or \\B in a
+    str pattern, or a negated class escape inside [...].
+    """
+    is_bytes = isinstance(source, bytes)
+    classes = _CLASSES[bytes if is_bytes else str]
+    text = source.decode("latin-1") if is_bytes else source
+    out = []
+    in_class = False
+    for match in _SYNTAX.finditer(text):
+        escape, opening, char = match.groups()
+        if escape is None:
+            if opening and not in_class:
+                in_class = True
+            elif char == "]" and in_class:
+                in_class = False
+            out.append(match.group(0))
+        elif escape.lower() in classes:
+            body = classes[escape.lower()]
+            if escape.islower():
+                out.append(body if in_class else f"[{body}]")
+            elif in_class:
+                raise ValueError(f"\\{escape} inside a character class")
+            else:
+                out.append(f"[^{body}]")
+        elif escape in "bB" and not is_bytes and not in_class:
+            raise ValueError(f"\\{escape} is ASCII-only in RE2")
+        else:
+            out.append(match.group(0))
+    text = "".join(out)
+    return text.encode("latin-1") if is_bytes else text
+
+
+def template_function(template):
+    """Return a function that expands `template` like re.sub would."""
+    is_bytes = isinstance(template, bytes)
+    text = template.decode("latin-1") if is_bytes else template
+
+    literals = [""]  # text before each group reference, then the trailing text
+    groups = []
+    pos = 0
+    for ref in _TEMPLATE_ESCAPE.finditer(text):
+        literals[-1] += text[pos:ref.start()]
+        pos = ref.end()
+        if ref.group(3) is not None:
+            literals[-1] += _ESCAPES.get(ref.group(3), ref.group(0))
+            continue
+        group = ref.group(1) or ref.group(2)
+        groups.append(int(group) if group.isdigit() else group)
+        literals.append("")
+    literals[-1] += text[pos:]
+    if is_bytes:
+        literals = [literal.encode("latin-1") for literal in literals]
+    empty = template[:0]  # "" or b"", matching the template type
+
+    def expand(match):
+        out = [literals[0]]
+        for group, literal in zip(groups, literals[1:]):
+            out.append(match.group(group) or empty)
+            out.append(literal)
+        return empty.join(out)
+
+    return expand
+
+
+def compile_rule(pattern, replacement, flags=0, re2_pattern=None):
+    """Compile one rule; return (compiled pattern, replacement, engine name).
+
+    `re2_pattern` is an equivalent spelling to use with RE2 when `pattern`
+    relies on features RE2 lacks.
+    """
+    if ENGINE != "re":
+        re2 = _load_re2()
+        if re2 is not None:
+            options = re2.Options()
+            # Unsupported syntax just means falling back to re; don't log it
+            options.log_errors = False
+            try:
+                source = re2_source(re2_pattern or pattern)
+                if isinstance(source, bytes):
+                    # Byte-oriented like re's bytes patterns; in its default
+                    # UTF-8 mode RE2 never matches invalid UTF-8
+                    options.encoding = re2.Options.Encoding.LATIN1
+                if flags & re.IGNORECASE:
+                    source = (b"(?i)" if isinstance(source, bytes) else "(?i)") + source
+                regex = re2.compile(source, options=options)
+                return regex, template_function(replacement), "re2"
+            except Exception:
+                pass
+    return re.compile(pattern, flags), replacement, "re"
+
+
+# re.IGNORECASE matches the dotted and the dotless i to "i"; casefold() adds
+# a combining dot to the first and leaves the second alone
+_DOTTED_I = str.maketrans("İı", "ii")
+
+
+def fold_case(text):
+    """Return `text` with characters that match each other ignoring case made equal.
+
+    A literal a case-insensitive rule matches occurs in fold_case(text) as
+    fold_case(literal), so redaction can look for trigger literals with a
+    plain substring check. lower() would miss some: both engines also equate
+    "ſ" with "s", and re "ς" with "σ". Bytes only ignore ASCII case.
+    """
+    if isinstance(text, bytes) or text.isascii():
+        return text.lower()
+    if "İ" in text or "ı" in text:
+        # translate() is slow, so only when needed
+        text = text.translate(_DOTTED_I)
+    return text.casefold()
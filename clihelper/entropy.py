@@ -0,0 +1,246 @@
+"""Entropy-based detection of secrets that no redaction rule knows the format of.
+
+Candidate tokens (runs of base64/hex-alphabet characters) are scored on
+Shannon entropy and character-class features, all candidates of a text in
+one batch. Random-looking tokens mixing upper case, lower case and digits
+are masked wherever they appear. Hex and other two-class tokens are masked
+only after a secret-ish word on the same line ("token", "Authorization:",
+"secret": ...), so commit SHAs, image digests and UUIDs in ordinary output
+survive. Base64 includes "/", so a token with one is narrowed to its
+segments from the first to the last that isn't a plain word before it is
+scored: a random file name is masked without taking its directory with it.
+
+Large batches are scored with NumPy when it is installed; otherwise, and for
+small batches where importing NumPy would cost more than it saves, a pure
+Python path gives the same answers.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+
+ENABLED = os.getenv("CLIHELPER_ENTROPY_DETECTOR", "1") != "0"
+
+REPLACEMENT = "REDACTED"
+
+# Shorter tokens carry too little entropy to tell apart from words
+MIN_LENGTH = 20
+TOKEN_CHARS = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/_-"
+TOKEN = re.compile(rb'[A-Za-z0-9+/_\-]+={0,2}')
+
+# Scanning is done on UTF-8 bytes: translating every token character to "a"
+# lets bytes.find() locate runs of MIN_LENGTH at C speed, several times
+# faster than a regex testing each position
+_RUN_TABLE = bytes(0x61 if i in TOKEN_CHARS else 0x20 for i in range(256))
+_RUN = b"a" * MIN_LENGTH
+_NON_LETTERS = b"0123456789+/_-="
+
+# A token must reach this fraction of the most entropy its length and
+# alphabet allow; random tokens land around 0.9-0.95, words well below
+ENTROPY_RATIO = 0.85
+
+# Fraction of adjacent character pairs that change class (upper/lower/digit):
+# about 0.64 for random base64, about 0.3 for CamelCase identifiers
+MIN_TRANSITIONS = 0.45
+
+# More than this fraction of +/_- looks like a path or option, not a secret
+MAX_SYMBOLS = 1 / 8
+
+# Path segments like this ("cache", "site-packages") are kept when at the
+# start or end of a token
+_PLAIN_SEGMENT = re.compile(rb'[a-z_\-+]*')
+
+# Two-class tokens need one of these words shortly before them on their line
+SECRET_CONTEXT = re.compile(
+    rb'auth|token|secret|key|passw|pwd|credential|bearer|session|cookie|signature|private',
+    re.IGNORECASE)
+CONTEXT_WINDOW = 32
+
+# Below this many candidates the pure Python path is faster than importing
+# and setting up NumPy
+VECTOR_MIN_TOKENS = 2048
+# Tokens scored per NumPy batch, which bounds its temporary arrays
+VECTOR_BATCH = 65536
+
+# Verdicts
+KEEP, MASK, MASK_IN_CONTEXT = 0, 1, 2
+
+_numpy = None
+
+
+def _load_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+def mask_secrets(text):
+    """Return (text with high-entropy tokens masked, number masked).
+
+    `text` may be str or bytes; the result has the same type.
+    """
+    binary = isinstance(text, bytes)
+    data = text if binary else text.encode("utf-8", "surrogatepass")
+    spans = candidates(data)
+    if not spans:
+        return text, 0
+    verdicts = score([data[start:end] for start, end in spans])
+
+    out = []
+    pos = 0
+    for (start, end), verdict in zip(spans, verdicts):
+        if verdict == KEEP:
+            continue
+        if verdict == MASK_IN_CONTEXT and not _in_context(data, start):
+            continue
+        out.append(data[pos:start])
+        out.append(REPLACEMENT.encode())
+        pos = end
+    if not out:
+        return text, 0
+    out.append(data[pos:])
+    masked = b"".join(out)
+    return masked if binary else masked.decode("utf-8", "surrogatepass"), len(out) // 2
+
+
+def candidates(data):
+    """Return (start, end) of every candidate token in bytes `data`."""
+    runs = data.translate(_RUN_TABLE)
+    spans = []
+    pos = runs.find(_RUN)
+    while pos != -1:
+        # find() returns the leftmost hit, which is always the start of a run
+        end = TOKEN.match(data, pos).end()
+        start, stop = _trim_path(data, pos, end)
+        # Runs without letters (ids, phone numbers, dates) are never secrets
+        if stop - start >= MIN_LENGTH and data[start:stop].translate(None, _NON_LETTERS):
+            spans.append((start, stop))
+        pos = runs.find(_RUN, end)
+    return spans
+
+
+def _trim_path(data, start, end):
+    """Return the span of a token without plain path segments at either end."""
+    token = data[start:end]
+    if b"/" not in token:
+        return start, end
+    segments = token.split(b"/")
+    plain = [_PLAIN_SEGMENT.fullmatch(segment) is not None for segment in segments]
+    if all(plain):
+        return start, start
+    first = plain.index(False)
+    last = len(plain) - 1 - plain[::-1].index(False)
+    start += sum(len(segment) + 1 for segment in segments[:first])
+    end -= sum(len(segment) + 1 for segment in segments[last + 1:])
+    return start, end
+
+
+def _in_context(data, start):
+    line_start = data.rfind(b"\n", 0, start) + 1
+    return SECRET_CONTEXT.search(data, max(line_start, start - CONTEXT_WINDOW), start) is not None
+
+
+def score(tokens):
+    """Return a KEEP/MASK/MASK_IN_CONTEXT verdict for each candidate token.
+
+    Tokens are ASCII bytes, as returned by candidates().
+    """
+    if len(tokens) >= VECTOR_MIN_TOKENS:
+        np = _load_numpy()
+        if np is not None:
+            verdicts = []
+            for i in range(0, len(tokens), VECTOR_BATCH):
+                verdicts.extend(_score_numpy(np, tokens[i:i + VECTOR_BATCH]).tolist())
+            return verdicts
+    return [_score_one(token) for token in tokens]
+
+
+def _char_class(c):
+    if 65 <= c <= 90:
+        return 1
+    if 97 <= c <= 122:
+        return 2
+    if 48 <= c <= 57:
+        return 3
+    return 0
+
+
+def _score_one(token):
+    length = len(token)
+    counts = Counter(token)
+    entropy = -sum(n / length * math.log2(n / length) for n in counts.values())
+    upper = lower = digits = hex_letters = 0
+    for c, n in counts.items():
+        cls = _char_class(c)
+        if cls == 1:
+            upper += n
+            hex_letters += n if c <= 70 else 0
+        elif cls == 2:
+            lower += n
+            hex_letters += n if c <= 102 else 0
+        elif cls == 3:
+            digits += n
+    symbols = length - upper - lower - digits
+    classes = [_char_class(c) for c in token]
+    transitions = sum(a != b for a, b in zip(classes, classes[1:]))
+    return _verdict(length, entropy, upper, lower, digits, hex_letters, symbols, transitions)
+
+
+def _verdict(length, entropy, upper, lower, digits, hex_letters, symbols, transitions):
+    if not digits or not (upper or lower) or symbols > length * MAX_SYMBOLS:
+        return KEEP
+    if upper and lower:
+        alphabet, verdict = 64, MASK
+        if transitions < (length - 1) * MIN_TRANSITIONS:
+            return KEEP
+    elif hex_letters == upper + lower:
+        alphabet, verdict = 16, MASK_IN_CONTEXT
+    else:
+        alphabet, verdict = 36, MASK_IN_CONTEXT
+    if entropy < ENTROPY_RATIO * math.log2(min(length, alphabet)):
+        return KEEP
+    return verdict
+
+
+def _score_numpy(np, tokens):
+    """Vectorized _score_one over a batch; same verdicts, one pass over the bytes."""
+    n = len(tokens)
+    lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=n)
+    data = np.frombuffer(b"".join(tokens), dtype=np.uint8)
+    ids = np.repeat(np.arange(n), lengths)
+
+    # Entropy from per-token character counts
+    pairs, counts = np.unique(ids * 256 + data, return_counts=True)
+    owner = pairs // 256
+    p = counts / lengths[owner]
+    entropy = np.bincount(owner, weights=-p * np.log2(p), minlength=n)
+
+    is_upper = (data >= 65) & (data <= 90)
+    is_lower = (data >= 97) & (data <= 122)
+    is_digit = (data >= 48) & (data <= 57)
+    is_hex = is_digit | ((data >= 65) & (data <= 70)) | ((data >= 97) & (data <= 102))
+    upper = np.bincount(ids, weights=is_upper, minlength=n)
+    lower = np.bincount(ids, weights=is_lower, minlength=n)
+    digits = np.bincount(ids, weights=is_digit, minlength=n)
+    hex_letters = np.bincount(ids, weights=is_hex & ~is_digit, minlength=n)
+    symbols = lengths - upper - lower - digits
+
+    classes = is_upper * 1 + is_lower * 2 + is_digit * 3
+    changed = (classes[1:] != classes[:-1]) & (ids[1:] == ids[:-1])
+    transitions = np.bincount(ids[1:], weights=changed, minlength=n)
+
+    mixed = (upper > 0) & (lower > 0)
+    hexish = ~mixed & (hex_letters == upper + lower)
+    alphabet = np.where(mixed, 64, np.where(hexish, 16, 36))
+    verdict = np.where(mixed, MASK, MASK_IN_CONTEXT)
+
+    keep = (digits == 0) | (upper + lower == 0) | (symbols > lengths * MAX_SYMBOLS)
+    keep |= mixed & (transitions < (lengths - 1) * MIN_TRANSITIONS)
+    keep |= entropy < ENTROPY_RATIO * np.log2(np.minimum(lengths, alphabet))
+    return np.where(keep, KEEP, verdict)
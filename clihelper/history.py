@@ -0,0 +1,330 @@
+"""Reading entries from the shell history file.
+
+bash, zsh and fish keep history in different formats; each has a backend
+here (BashHistory, ZshHistory, FishHistory) that reads it into the same
+HistoryEntry records, and detect() picks the user's from $SHELL and
+$HISTFILE. All of them read recent entries backwards from the end of the
+file, so the cost doesn't grow with the file.
+"""
+
+import os
+import re
+from collections import namedtuple
+from pathlib import Path
+
+# timestamp is epoch seconds and duration seconds, each None if not recorded
+HistoryEntry = namedtuple("HistoryEntry", ["command", "timestamp", "duration"])
+HistoryEntry.__new__.__defaults__ = (None,)
+
+BLOCK_SIZE = 8192
+
+# With HISTTIMEFORMAT set, bash writes "#<epoch>" before every entry
+TIMESTAMP_LINE = re.compile(r'#(\d{9,11})$')
+
+# zsh EXTENDED_HISTORY: ": <start>:<elapsed>;<command>"
+ZSH_EXTENDED = re.compile(r': *(\d+):(\d+);(.*)', re.DOTALL)
+# zsh stores bytes that are special to it as 0x83 followed by the byte ^ 0x20
+ZSH_META = b"\x83"
+
+# fish: "- cmd: <escaped command>", then indented "when: <epoch>", "paths:" ...
+FISH_CMD = "- cmd: "
+FISH_WHEN = re.compile(r'\s+when: (\d+)$')
+FISH_ESCAPE = re.compile(r'\\(.)')
+
+# How far past `n` lines to look for a timestamp before treating the file as
+# plain one-command-per-line history
+MAX_ENTRY_LINES = 64
+
+
+def reverse_lines(f, block_size=BLOCK_SIZE):
+    """Yield the lines of binary file `f` from last to first.
+
+    Blocks are read backwards from EOF, so stopping early costs only the
+    bytes actually consumed. A trailing newline yields an empty last line.
+    """
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    partial = b""
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        lines = (f.read(step) + partial).split(b"\n")
+        partial = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+    yield partial
+
+
+def tail_entries(path, n, since=None):
+    """Return the last `n` entries of a bash history file, oldest first.
+
+    Timestamp lines are consumed rather than returned; when present they
+    delimit entries, so multi-line commands stay together. With `since`
+    (epoch seconds), only timestamped entries from then on are returned and
+    reading stops at the first older one.
+    """
+    entries = []
+    pending = []  # lines of the entry being assembled, newest first
+
+    with open(path, "rb") as f:
+        for raw in reverse_lines(f):
+            line = raw.decode("utf-8", "replace").rstrip("\r")
+            match = TIMESTAMP_LINE.match(line)
+            if match:
+                if since is not None and int(match.group(1)) < since:
+                    break
+                if pending:
+                    entries.append(HistoryEntry("\n".join(reversed(pending)),
+                                                int(match.group(1))))
+                    pending = []
+                    if len(entries) >= n:
+                        break
+            elif line:
+                pending.append(line)
+                # Also stops on history from before HISTTIMEFORMAT, which has
+                # fewer timestamps than `n` entries or none for a window query
+                if len(pending) >= n + MAX_ENTRY_LINES:
+                    break
+
+    # Lines with no timestamp above them are one command each
+    if since is None:
+        entries.extend(HistoryEntry(line, None) for line in pending)
+    return entries[:n][::-1]
+
+
+def read_entries(path, offset=0):
+    """Return (entries, end) for the complete lines of `path` after byte `offset`.
+
+    `end` is the offset just past the last newline, so a line still being
+    written is left for the next call. Entries are grouped like
+    tail_entries() does, oldest first.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    cut = data.rfind(b"\n") + 1
+    entries = []
+    pending = []
+    timestamp = None
+    for raw in data[:cut].split(b"\n")[:-1]:
+        line = raw.decode("utf-8", "replace").rstrip("\r")
+        match = TIMESTAMP_LINE.match(line)
+        if match:
+            if pending:
+                entries.append(HistoryEntry("\n".join(pending), timestamp))
+            pending = []
+            timestamp = int(match.group(1))
+        elif not line:
+            continue
+        elif timestamp is None:
+            entries.append(HistoryEntry(line, None))
+        else:
+            pending.append(line)
+    if pending:
+        entries.append(HistoryEntry("\n".join(pending), timestamp))
+    return entries, offset + cut
+
+
+def _in_window(entry, since):
+    return since is None or (entry.timestamp is not None and entry.timestamp >= since)
+
+
+def unmetafy(data):
+    """Undo zsh's metafication of history bytes `data`."""
+    if ZSH_META not in data:
+        return data
+    parts = data.split(ZSH_META)
+    return parts[0] + b"".join(bytes([part[0] ^ 0x20]) + part[1:] for part in parts[1:] if part)
+
+
+def _zsh_line(raw):
+    return unmetafy(raw).decode("utf-8", "replace").rstrip("\r")
+
+
+def _zsh_entry(lines):
+    text = "\n".join(lines)
+    match = ZSH_EXTENDED.match(text)
+    if match:
+        return HistoryEntry(match.group(3), int(match.group(1)), int(match.group(2)))
+    return HistoryEntry(text, None)
+
+
+def zsh_tail_entries(path, n, since=None):
+    """Return the last `n` entries of a zsh history file, oldest first.
+
+    Newlines inside a command are stored as backslash-newline, so a line
+    continues the entry started on an earlier line ending in a backslash.
+    `since` is as for tail_entries(); it needs EXTENDED_HISTORY.
+    """
+    entries = []
+    pending = []  # lines of the entry being assembled, newest first
+    with open(path, "rb") as f:
+        for raw in reverse_lines(f):
+            line = _zsh_line(raw)
+            if pending and line.endswith("\\"):
+                pending.append(line[:-1])
+                continue
+            if pending:
+                entry = _zsh_entry(reversed(pending))
+                if not _in_window(entry, since):
+                    pending = []
+                    break
+                entries.append(entry)
+                if len(entries) >= n:
+                    break
+            pending = [line] if line else []
+    if pending and len(entries) < n:
+        entry = _zsh_entry(reversed(pending))
+        if _in_window(entry, since):
+            entries.append(entry)
+    return entries[::-1]
+
+
+def zsh_read_entries(path, offset=0):
+    """Return (entries, end) for the complete entries of `path` after byte `offset`.
+
+    Like read_entries(); an entry whose last line still ends in a backslash
+    is left for the next call.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    entries = []
+    pending = []
+    pos = end = 0
+    for raw in data[:data.rfind(b"\n") + 1].split(b"\n")[:-1]:
+        pos += len(raw) + 1
+        line = _zsh_line(raw)
+        if line.endswith("\\"):
+            pending.append(line[:-1])
+            continue
+        pending.append(line)
+        if pending != [""]:
+            entries.append(_zsh_entry(pending))
+        pending = []
+        end = pos
+    return entries, offset + end
+
+
+def _fish_command(escaped):
+    return FISH_ESCAPE.sub(lambda m: "\n" if m.group(1) == "n" else m.group(1), escaped)
+
+
+def fish_tail_entries(path, n, since=None):
+    """Return the last `n` entries of a fish history file, oldest first.
+
+    `since` is as for tail_entries().
+    """
+    entries = []
+    timestamp = None  # from the "when:" line below the "- cmd:" line
+    with open(path, "rb") as f:
+        for raw in reverse_lines(f):
+            line = raw.decode("utf-8", "replace").rstrip("\r")
+            match = FISH_WHEN.match(line)
+            if match:
+                timestamp = int(match.group(1))
+            elif line.startswith(FISH_CMD):
+                entry = HistoryEntry(_fish_command(line[len(FISH_CMD):]), timestamp)
+                if not _in_window(entry, since):
+                    break
+                entries.append(entry)
+                timestamp = None
+                if len(entries) >= n:
+                    break
+    return entries[::-1]
+
+
+def fish_read_entries(path, offset=0):
+    """Return (entries, end) for the complete lines of `path` after byte `offset`.
+
+    fish writes each record in one go, so a record is taken to be complete
+    once its lines are.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    cut = data.rfind(b"\n") + 1
+    entries = []
+    for raw in data[:cut].split(b"\n")[:-1]:
+        line = raw.decode("utf-8", "replace").rstrip("\r")
+        match = FISH_WHEN.match(line)
+        if match and entries and entries[-1].timestamp is None:
+            entries[-1] = entries[-1]._replace(timestamp=int(match.group(1)))
+        elif line.startswith(FISH_CMD):
+            entries.append(HistoryEntry(_fish_command(line[len(FISH_CMD):]), None))
+    return entries, offset + cut
+
+
+class BashHistory:
+    """A bash history file: one command per line, or "#<epoch>"-delimited entries."""
+
+    shell = "bash"
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else self.default_path()
+
+    @staticmethod
+    def default_path():
+        return Path.home() / ".bash_history"
+
+    def tail(self, n, since=None):
+        """Return the last `n` entries, oldest first.
+
+        With `since` (epoch seconds), only entries timestamped from then on,
+        reading back no further than the first older entry.
+        """
+        return tail_entries(self.path, n, since)
+
+    def read(self, offset=0):
+        """Return (entries, end offset) for the complete entries after `offset`."""
+        return read_entries(self.path, offset)
+
+
+class ZshHistory(BashHistory):
+    """A zsh history file, with or without EXTENDED_HISTORY."""
+
+    shell = "zsh"
+
+    @staticmethod
+    def default_path():
+        return Path(os.getenv("ZDOTDIR") or Path.home()) / ".zsh_history"
+
+    def tail(self, n, since=None):
+        return zsh_tail_entries(self.path, n, since)
+
+    def read(self, offset=0):
+        return zsh_read_entries(self.path, offset)
+
+
+class FishHistory(BashHistory):
+    """fish's history file (fish doesn't use $HISTFILE)."""
+
+    shell = "fish"
+
+    @staticmethod
+    def default_path():
+        data = Path(os.getenv("XDG_DATA_HOME") or Path.home() / ".local" / "share")
+        return data / "fish" / "fish_history"
+
+    def tail(self, n, since=None):
+        return fish_tail_entries(self.path, n, since)
+
+    def read(self, offset=0):
+        return fish_read_entries(self.path, offset)
+
+
+BACKENDS = {backend.shell: backend for backend in (BashHistory, ZshHistory, FishHistory)}
+
+
+def detect(environ=os.environ):
+    """Return the history backend of the user's shell.
+
+    The shell is taken from $SHELL (bash if unknown) and the file from
+    $HISTFILE when exported, else that shell's default location.
+    """
+    backend = BACKENDS.get(Path(environ.get("SHELL", "")).name, BashHistory)
+    histfile = environ.get("HISTFILE")
+    if histfile and backend is not FishHistory:
+        return backend(Path(histfile).expanduser())
+    return backend()
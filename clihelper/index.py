@@ -0,0 +1,412 @@
+"""Persistent BM25 index over the whole shell history.
+
+Instead of always sending the last few commands, CLIHelper picks the
+history entries most relevant to the error or question (scored with BM25
+against its tokens) and adds the most recent few. The index lives in a
+SQLite database and is brought up to date incrementally: the byte offset
+reached in the history file is stored with it, so each run only reads and
+indexes lines appended since.
+
+The file's inode, size and mtime are stored too; while they are unchanged
+a sync reads nothing. Otherwise the stored bytes just before the offset are
+looked for. When bash trims the oldest entries to HISTFILESIZE (rewriting
+the file on exit), they are found again further back, and indexing carries
+on from there; the trimmed commands stay in the index. If they aren't
+found, the file was rotated, truncated or rewritten, and it is re-read from
+the start. Commands are stored once, redacted, with every run of them (its
+timestamp, if the shell recorded one). The index is also rebuilt when the
+redaction rules change.
+
+A first build of a large history takes seconds, so a sync can be given a
+limit: past it, NotReady is raised, and build_in_background() does the work
+in a separate `python -m clihelper.index` process instead.
+
+Where SQLite has FTS5, commands are also full-text indexed for recall-style
+lookups ("what was that docker command?") with prefix and "phrase"
+matching; see fts_query(). Runs are indexed by timestamp for window(), and
+commands by their text for prefix().
+"""
+
+import math
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from . import history
+
+INDEX_PATH = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "clihelper" / "history.db"
+# Held by the background build, so only one runs at a time
+BUILD_LOCK = INDEX_PATH.with_suffix(".lock")
+
+# Bump when the schema or tokenizer changes; the index is then rebuilt
+SCHEMA_VERSION = 4
+
+# Okapi BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TERM = re.compile(r'[a-z0-9_]{2,}')
+
+# Bytes before the offset that identify where indexing stopped; long enough
+# that repeated commands rarely reproduce them elsewhere in the file
+TAIL_BYTES = 1024
+# Read size when looking for them further back in a trimmed file
+SEARCH_BLOCK = 1024 * 1024
+
+# How long a sync without a limit waits for another one (seconds); a sync
+# with a limit doesn't wait
+SYNC_TIMEOUT = 60
+
+# SQLite's default limit on bound parameters is 999 in older builds
+_BATCH = 500
+
+# Words of a question that say nothing about the command being recalled
+STOPWORDS = frozenset("""
+    a an and are at before can command commands did do does earlier for from had
+    how i in is it last me my of on once one ran run running that the this time to
+    type typed use used was we were what which with you
+""".split())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL UNIQUE,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    seq INTEGER PRIMARY KEY,
+    entry INTEGER NOT NULL,
+    timestamp INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_entry ON runs (entry, seq);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    entry INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, entry)
+) WITHOUT ROWID;
+"""
+
+# Full-text index over entries.command, without a second copy of the text
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    command, content='entries', content_rowid='id', prefix='2 3'
+);
+"""
+
+
+class NotReady(Exception):
+    """Raised by a limited sync when the index is busy or too far behind."""
+
+
+def tokenize(text):
+    """Return the index terms of `text`: lowercase runs of letters, digits and _."""
+    return TERM.findall(text.lower())
+
+
+def fts_query(text):
+    """Turn a question or search string into an FTS5 query.
+
+    Double-quoted parts are matched as phrases; every other word that isn't
+    a stopword is matched as a prefix ("dock" finds "docker"). Any match
+    counts, and FTS5's bm25() ranks entries matching more of them first.
+    Returns "" if nothing is left to search for.
+    """
+    phrases = re.findall(r'"([^"]+)"', text)
+    words = tokenize(re.sub(r'"[^"]*"', " ", text))
+    parts = ['"%s"' % phrase.replace('"', '""') for phrase in phrases]
+    parts += ['"%s"*' % word for word in dict.fromkeys(words) if word not in STOPWORDS]
+    return " OR ".join(parts)
+
+
+class HistoryIndex:
+    """BM25-searchable copy of a history file, kept in sync by sync().
+
+    `source` is the history.BashHistory, ZshHistory or FishHistory to index.
+    """
+
+    def __init__(self, source, path=INDEX_PATH):
+        self.source = source
+        self.history_path = source.path
+        self.path = Path(path)
+        self.fts = None  # whether SQLite has FTS5, known after connecting
+
+    def _connect(self, timeout=5):
+        import sqlite3
+
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        new = not self.path.exists()
+        db = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        if new:
+            # Redacted, but still the user's commands
+            os.chmod(self.path, 0o600)
+        db.executescript(_SCHEMA)
+        if self.fts is None:
+            try:
+                db.executescript(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+        return db
+
+    def sync(self, redact_commands, version="", limit=None):
+        """Index history lines appended since the last sync; return how many.
+
+        `redact_commands` maps a list of commands to their redacted forms;
+        only those are stored. `version` identifies the redaction rules, and
+        a change rebuilds the index from scratch.
+
+        With `limit`, NotReady is raised instead, leaving the index as it
+        was, if more than `limit` bytes of the file are unindexed or another
+        process is syncing.
+        """
+        import sqlite3
+
+        try:
+            db = self._connect(SYNC_TIMEOUT if limit is None else 0.1)
+            # Serialises concurrent runs: the second one sees the new offset
+            db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if limit is None:
+                raise
+            raise NotReady(f"history index is busy: {e}")
+        try:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            st = self.history_path.stat()
+            size = st.st_size
+            history_id = f"{self.source.shell}:{self.history_path}"
+            offset = None
+            if (meta.get("schema") == SCHEMA_VERSION and meta.get("version") == version
+                    and meta.get("history") == history_id):
+                if (meta.get("inode"), meta.get("size"), meta.get("mtime")) == (
+                        st.st_ino, size, st.st_mtime_ns):
+                    db.execute("ROLLBACK")  # untouched since the last sync
+                    return 0
+                # A new inode is no reason to start over: bash writes a
+                # trimmed history to a new file and renames it into place
+                offset = self._resume_offset(meta["offset"], bytes.fromhex(meta["tail"]))
+            if limit is not None and size - (offset or 0) > limit:
+                raise NotReady(f"{size - (offset or 0)} bytes of history to index")
+
+            if offset is None:
+                db.execute("DELETE FROM entries")
+                db.execute("DELETE FROM postings")
+                db.execute("DELETE FROM runs")
+                if self.fts:
+                    db.execute("INSERT INTO entries_fts (entries_fts) VALUES ('delete-all')")
+                offset = 0
+
+            added = 0
+            if size > offset:
+                entries, end = self.source.read(offset)
+                commands = redact_commands([e.command for e in entries])
+                for entry, command in zip(entries, commands):
+                    self._add(db, command, entry.timestamp)
+                added = len(entries)
+                offset = end
+
+            db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+                ("schema", SCHEMA_VERSION), ("version", version), ("history", history_id),
+                ("offset", offset), ("tail", self._tail(offset).hex()),
+                ("inode", st.st_ino), ("size", size), ("mtime", st.st_mtime_ns)])
+            db.execute("COMMIT")
+            return added
+        finally:
+            db.close()
+
+    def _tail(self, offset):
+        with open(self.history_path, "rb") as f:
+            f.seek(max(0, offset - TAIL_BYTES))
+            return f.read(offset - f.tell())
+
+    def _resume_offset(self, offset, tail):
+        """Return where indexing continues: `offset` if the file still has
+        `tail` right before it, else just after its last occurrence before
+        `offset` (the file lost entries from the front), else None.
+        """
+        with open(self.history_path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            if offset <= size:
+                f.seek(offset - len(tail))
+                if f.read(len(tail)) == tail:
+                    return offset
+            end = min(offset, size)
+            while end >= len(tail) > 0:
+                start = max(0, end - SEARCH_BLOCK)
+                f.seek(start)
+                found = f.read(end - start).rfind(tail)
+                if found != -1:
+                    return start + found + len(tail)
+                if start == 0:
+                    break
+                # Overlap the blocks so an occurrence across them is found
+                end = start + len(tail) - 1
+        return None
+
+    def _add(self, db, command, timestamp):
+        row = db.execute("SELECT id FROM entries WHERE command = ?", (command,)).fetchone()
+        if row:
+            entry = row[0]
+        else:
+            terms = tokenize(command)
+            entry = db.execute("INSERT INTO entries (command, length) VALUES (?, ?)",
+                               (command, len(terms))).lastrowid
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            db.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                           [(term, entry, tf) for term, tf in counts.items()])
+            if self.fts:
+                db.execute("INSERT INTO entries_fts (rowid, command) VALUES (?, ?)",
+                           (entry, command))
+        db.execute("INSERT INTO runs (entry, timestamp) VALUES (?, ?)", (entry, timestamp))
+
+    def _query(self, sql, params):
+        """Return HistoryEntry rows of (command, timestamp), in SQL order."""
+        db = self._connect()
+        try:
+            return [history.HistoryEntry(*row) for row in db.execute(sql, params)]
+        finally:
+            db.close()
+
+    def recent(self, n):
+        """Return the last `n` distinct commands run, oldest first."""
+        db = self._connect()
+        try:
+            # Rows are produced lazily, newest first, so this reads only as
+            # far back as it takes to find n distinct commands
+            rows = db.execute("SELECT e.command, r.timestamp FROM runs r "
+                              "JOIN entries e ON e.id = r.entry ORDER BY r.seq DESC")
+            entries = {}
+            for command, timestamp in rows:
+                entries.setdefault(command, timestamp)
+                if len(entries) >= n:
+                    break
+        finally:
+            db.close()
+        return [history.HistoryEntry(*item) for item in reversed(entries.items())]
+
+    def window(self, start, end, limit=100):
+        """Return distinct commands run between epoch seconds `start` and `end`.
+
+        Only timestamped entries can match (bash with HISTTIMEFORMAT, zsh
+        with EXTENDED_HISTORY, fish). Each command comes once, with its
+        latest run in the window; the `limit` most recently run are
+        returned, oldest first.
+        """
+        return self._query(
+            "SELECT e.command, MAX(r.timestamp) AS last FROM runs r "
+            "JOIN entries e ON e.id = r.entry WHERE r.timestamp BETWEEN ? AND ? "
+            "GROUP BY r.entry ORDER BY MAX(r.seq) DESC LIMIT ?", (start, end, limit))[::-1]
+
+    def prefix(self, prefix, limit=100):
+        """Return distinct commands starting with `prefix`, most recently run first."""
+        # A range on the unique index rather than LIKE, which can't use it
+        return self._query(
+            "SELECT e.command, MAX(r.timestamp) FROM entries e JOIN runs r ON r.entry = e.id "
+            "WHERE e.command >= ? AND e.command < ? "
+            "GROUP BY e.id ORDER BY MAX(r.seq) DESC LIMIT ?",
+            (prefix, prefix + "\U0010ffff", limit))
+
+    def search(self, text, k, exclude=()):
+        """Return up to `k` commands best matching `text`, best first.
+
+        Commands in `exclude` are skipped, as are entries no term matched.
+        """
+        terms = list(set(tokenize(text)))
+        if not terms:
+            return []
+        db = self._connect()
+        try:
+            count, total = db.execute("SELECT COUNT(*), SUM(length) FROM entries").fetchone()
+            if not count:
+                return []
+            avgdl = (total or 0) / count or 1
+
+            scores = {}
+            for i in range(0, len(terms), _BATCH):
+                batch = terms[i:i + _BATCH]
+                marks = ",".join("?" * len(batch))
+                df = dict(db.execute(
+                    f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term",
+                    batch))
+                rows = db.execute(
+                    "SELECT p.term, p.entry, p.tf, e.length FROM postings p "
+                    f"JOIN entries e ON e.id = p.entry WHERE p.term IN ({marks})", batch)
+                for term, entry, tf, length in rows:
+                    idf = math.log((count - df[term] + 0.5) / (df[term] + 0.5) + 1)
+                    norm = tf + K1 * (1 - B + B * length / avgdl)
+                    scores[entry] = scores.get(entry, 0) + idf * tf * (K1 + 1) / norm
+
+            # Ties go to the more recently added command
+            ranked = sorted(scores, key=lambda entry: (scores[entry], entry), reverse=True)
+            results = []
+            for entry in ranked:
+                command, timestamp = db.execute(
+                    "SELECT e.command, MAX(r.timestamp) FROM entries e "
+                    "JOIN runs r ON r.entry = e.id WHERE e.id = ?", (entry,)).fetchone()
+                if command in exclude:
+                    continue
+                results.append(history.HistoryEntry(command, timestamp))
+                if len(results) >= k:
+                    break
+            return results
+        finally:
+            db.close()
+
+    def find(self, text, limit=20):
+        """Return commands matching question or search string `text`, best first.
+
+        Uses FTS5 (see fts_query()) when SQLite has it, else the BM25 search.
+        """
+        query = fts_query(text)
+        if not query:
+            return []
+        db = self._connect()
+        if not self.fts:
+            db.close()
+            return self.search(" ".join(w for w in tokenize(text) if w not in STOPWORDS), limit)
+        try:
+            # Ties go to the more recently added command
+            ids = [row[0] for row in db.execute(
+                "SELECT rowid FROM entries_fts WHERE entries_fts MATCH ? "
+                "ORDER BY bm25(entries_fts), rowid DESC LIMIT ?", (query, limit))]
+            return [history.HistoryEntry(*db.execute(
+                "SELECT e.command, MAX(r.timestamp) FROM entries e "
+                "JOIN runs r ON r.entry = e.id WHERE e.id = ?", (entry,)).fetchone())
+                for entry in ids]
+        finally:
+            db.close()
+
+
+def build_in_background(source):
+    """Sync the index of history backend `source` in a detached process."""
+    subprocess.Popen([sys.executable, "-m", "clihelper.index", source.shell, str(source.path)],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def main(argv=None):
+    """Sync the index without a limit: python -m clihelper.index SHELL HISTORY_FILE."""
+    import fcntl
+
+    from . import redact
+
+    shell, history_path = argv or sys.argv[1:]
+    BUILD_LOCK.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with open(BUILD_LOCK, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return  # another build is already running
+        os.nice(10)
+        source = history.BACKENDS[shell](history_path)
+        HistoryIndex(source).sync(redact.redact_many, redact.ruleset_version())
+
+
+if __name__ == "__main__":
+    main()
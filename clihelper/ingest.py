@@ -0,0 +1,140 @@
+"""Bounded-memory capture of piped command output.
+
+Only the head, the tail and error-looking lines in between are kept, so
+memory stays flat however much is piped in. Output is handled as raw bytes,
+never decoded here: tools that print invalid UTF-8 can't break the capture,
+and only the retained excerpt is ever decoded, after redaction. The caps can
+be tuned with the CLIHELPER_STDIN_HEAD_BYTES, CLIHELPER_STDIN_TAIL_BYTES and
+CLIHELPER_STDIN_FLAGGED_BYTES environment variables.
+"""
+
+import os
+import re
+from collections import deque
+
+from .redact import PEM_BEGIN_BYTES, PEM_END_BYTES
+
+HEAD_BYTES = int(os.getenv("CLIHELPER_STDIN_HEAD_BYTES", 16 * 1024))
+TAIL_BYTES = int(os.getenv("CLIHELPER_STDIN_TAIL_BYTES", 32 * 1024))
+FLAGGED_BYTES = int(os.getenv("CLIHELPER_STDIN_FLAGGED_BYTES", 16 * 1024))
+
+CHUNK_SIZE = 64 * 1024
+
+# Longer lines are truncated; an unterminated line is cut here too
+MAX_LINE = 4096
+
+# The partial word left at the end of a truncated line
+_CUT_WORD = re.compile(rb'\S+\Z')
+
+ERROR_LINE = re.compile(
+    rb'error|fail|fatal|exception|traceback|denied|not found|no such|'
+    rb'cannot|invalid|panic|segmentation fault|abort',
+    re.IGNORECASE)
+
+
+class StdinCapture:
+    """Keep the head, tail and flagged error lines of a binary line stream."""
+
+    def __init__(self, head_bytes=HEAD_BYTES, tail_bytes=TAIL_BYTES,
+                 flagged_bytes=FLAGGED_BYTES):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.flagged_bytes = flagged_bytes
+
+        self.head = []
+        self.head_size = 0
+        self.head_full = False
+        self.tail = deque()  # (line number, line)
+        self.tail_size = 0
+        self.flagged = []  # (line number, line)
+        self.flagged_size = 0
+
+        self.total_bytes = 0
+        self.total_lines = 0
+        self._partial = b""
+        self._skip_line = False  # dropping the rest of a line cut at MAX_LINE
+        self._in_key = False
+
+    def read(self, stream, chunk_size=CHUNK_SIZE):
+        """Consume binary `stream` (e.g. sys.stdin.buffer) to EOF in fixed-size chunks."""
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            self.feed(chunk)
+        self.close()
+        return self
+
+    def feed(self, chunk):
+        self.total_bytes += len(chunk)
+        if self._skip_line:
+            # Kept as its own line, the rest would be cut off from its key
+            # ("password=hu" | "nter2") and escape redaction
+            newline = chunk.find(b"\n")
+            if newline == -1:
+                return
+            chunk = chunk[newline + 1:]
+            self._skip_line = False
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add(line)
+        if len(self._partial) > MAX_LINE:
+            self._add(self._partial)
+            self._partial = b""
+            self._skip_line = True
+
+    def close(self):
+        if self._partial:
+            self._add(self._partial)
+            self._partial = b""
+
+    def _add(self, line):
+        index = self.total_lines
+        self.total_lines += 1
+        if len(line) > MAX_LINE:
+            # Without the partial word: what is left of a secret might be too
+            # short for its rule ("api_key=ghp_Ab3") and escape redaction
+            line = _CUT_WORD.sub(b"", line[:MAX_LINE])
+
+        # Private-key bodies are never retained; only their BEGIN/END marker
+        # lines are, so a block cut by the head or tail boundary can't leak
+        # key material past redaction.
+        begin = PEM_BEGIN_BYTES.search(line)
+        end = PEM_END_BYTES.search(line)
+        if self._in_key and not end:
+            return
+        if begin or end:
+            self._in_key = bool(begin) and not end
+
+        size = len(line) + 1
+        if not self.head_full:
+            if self.head_size + size <= self.head_bytes:
+                self.head.append(line)
+                self.head_size += size
+                return
+            self.head_full = True
+
+        if ERROR_LINE.search(line) and self.flagged_size + size <= self.flagged_bytes:
+            self.flagged.append((index, line))
+            self.flagged_size += size
+
+        self.tail.append((index, line))
+        self.tail_size += size
+        while self.tail_size > self.tail_bytes:
+            _, dropped = self.tail.popleft()
+            self.tail_size -= len(dropped) + 1
+
+    def render(self):
+        """Return the retained bytes: head, flagged lines that fell out, tail."""
+        first_tail = self.tail[0][0] if self.tail else self.total_lines
+        omitted = first_tail - len(self.head)
+        if omitted <= 0:
+            return b"\n".join(self.head + [line for _, line in self.tail])
+
+        middle = [line for index, line in self.flagged if index < first_tail]
+        note = f"[... {omitted} lines ({self.total_bytes} bytes total) omitted"
+        if middle:
+            note += f"; {len(middle)} error lines from them follow"
+        note += " ...]"
+        return b"\n".join(self.head + [note.encode()] + middle + [line for _, line in self.tail])
@@ -0,0 +1,284 @@
+"""User-defined redaction rules, loaded next to the built-in ones.
+
+Rules come from $CLIHELPER_RULES or ~/.config/clihelper/rules.toml (or
+rules.json). TOML needs Python 3.11+; JSON works everywhere:
+
+    [[rule]]
+    name = "corp_token"
+    pattern = "corp_[A-Za-z0-9]{32}"
+    replacement = "corp_REDACTED"
+    triggers = ["corp_"]      # optional lowercase literals, see redact.RULES
+    ignore_case = true        # optional, default true
+
+Each rule is compiled and vetted once per process (or daemon lifetime): rules
+with nested quantifiers are rejected outright, and on pathological probe inputs
+the rest must not take time growing faster than MAX_GROWTH (unless they run on
+the linear-time RE2 engine, see engine.py). Verdicts are remembered in
+VETTED_FILE so later runs skip the probes.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+from . import engine
+
+CONFIG_DIR = Path(os.getenv("XDG_CONFIG_HOME") or Path.home() / ".config") / "clihelper"
+VETTED_FILE = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "clihelper" / "vetted_rules.json"
+
+# A rule is rejected when its probe search time grows faster than this
+# power of the input length. Exponential backtracking does within a few
+# characters; the quadratic scan of an ordinary unanchored pattern such as
+# [a-z0-9-]+\.corp\.example\.com doesn't
+MAX_GROWTH = 3
+
+# Probe searches shorter than this (seconds) are too noisy to judge growth by
+PROBE_FLOOR = 0.001
+
+# Probing one kind of input stops once a search takes this long
+PROBE_BUDGET = 0.02
+
+# Small steps first: exponential blowups show up within a few characters,
+# polynomial ones only on longer inputs
+PROBE_SIZES = (8, 12, 16, 20, 24, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+# A quantified group that itself contains a quantifier, e.g. (a+)+ or (\w*x?)*
+NESTED_QUANTIFIER = re.compile(r'\((?:[^()\\]|\\.)*(?:[+*]|\{\d+,\d*\})(?:[^()\\]|\\.)*\)(?:[+*]|\{\d+,\d*\})')
+
+_loaded = None
+_loaded_bytes = None
+_digest = ""
+_sources = []  # (name, pattern, replacement, flags, bytes triggers) of accepted rules
+
+
+def rules_path():
+    """Return the configured rules file, or None if there is none."""
+    if env := os.getenv("CLIHELPER_RULES"):
+        return Path(env)
+    for name in ("rules.toml", "rules.json"):
+        if (CONFIG_DIR / name).exists():
+            return CONFIG_DIR / name
+    return None
+
+
+def user_rules():
+    """Return the compiled user rules, loading them on first use."""
+    global _loaded, _digest, _sources
+    if _loaded is None:
+        path = rules_path()
+        _loaded, _digest, _sources = _load(path) if path else ([], "", [])
+    return _loaded
+
+
+def user_rules_bytes():
+    """Return the user rules compiled for bytes input, or None if any can't be.
+
+    Patterns are UTF-8 encoded, so a literal non-ASCII character still
+    matches; a pattern that only makes sense on text (e.g. a Unicode escape)
+    fails to compile and the caller has to redact decoded text instead.
+    """
+    global _loaded_bytes
+    if _loaded_bytes is None:
+        user_rules()
+        compiled = []
+        try:
+            for name, pattern, replacement, flags, triggers in _sources:
+                regex, replacement, _ = engine.compile_rule(
+                    pattern.encode(), replacement.encode(), flags)
+                compiled.append((name, regex, replacement, triggers))
+        except (re.error, ValueError, TypeError, AttributeError):
+            compiled = False
+        _loaded_bytes = compiled
+    return _loaded_bytes if _loaded_bytes is not False else None
+
+
+def digest():
+    """Return a digest of the user rules in effect, or "" if there are none."""
+    user_rules()
+    return _digest
+
+
+def load_rules(path):
+    """Parse, compile and vet the rules in `path`; warn about rejected ones.
+
+    Returns (name, compiled pattern, replacement, triggers) tuples in the
+    same shape as the built-in rules.
+    """
+    return _load(path)[0]
+
+
+def _load(path):
+    try:
+        entries = _parse(Path(path))
+    except (OSError, ValueError, ImportError) as e:
+        print(f"⚠️ Could not load redaction rules from {path}: {e}", file=sys.stderr)
+        return [], "", []
+
+    vetted = _read_vetted()
+    known = len(vetted)
+    compiled = []
+    accepted = []
+    sources = []
+    for index, entry in enumerate(entries):
+        name = entry.get("name") or f"user_rule_{index}"
+        try:
+            compiled.append(_compile(name, entry, vetted))
+            accepted.append(entry)
+            sources.append(_source(name, entry))
+        except ValueError as e:
+            print(f"⚠️ Skipping redaction rule '{name}': {e}", file=sys.stderr)
+    if len(vetted) != known:
+        _write_vetted(vetted)
+    if not accepted:
+        return compiled, "", sources
+    # Only the accepted rules affect output, so a rejected one doesn't count
+    source = json.dumps(accepted, sort_keys=True, default=str)
+    return compiled, hashlib.sha256(source.encode()).hexdigest(), sources
+
+
+def _read_vetted():
+    """Return {pattern fingerprint: why it was rejected, or "" if it passed}."""
+    try:
+        vetted = json.loads(VETTED_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+    return vetted if isinstance(vetted, dict) else {}
+
+
+def _write_vetted(vetted):
+    try:
+        VETTED_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = VETTED_FILE.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(vetted, sort_keys=True))
+        os.replace(tmp, VETTED_FILE)
+    except OSError:
+        pass
+
+
+def _parse(path):
+    if path.suffix == ".toml":
+        import tomllib
+
+        data = tomllib.loads(path.read_text())
+    else:
+        data = json.loads(path.read_text())
+    entries = data.get("rule", data.get("rules", [])) if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError("expected a list of rule tables")
+    return entries
+
+
+def _flags(entry):
+    return re.IGNORECASE if entry.get("ignore_case", True) else 0
+
+
+def _triggers(entry, binary=False):
+    triggers = entry.get("triggers")
+    if triggers is None:
+        return None
+    # A string would be split into characters, and an empty list would
+    # silently disable the rule
+    if (not isinstance(triggers, list) or not triggers
+            or not all(isinstance(t, str) and t for t in triggers)):
+        raise ValueError("triggers must be a non-empty list of non-empty strings")
+    # Folded like the text they're looked for in (see redact.RULES)
+    return tuple(engine.fold_case(t.encode() if binary else t) for t in triggers)
+
+
+def _source(name, entry):
+    """Return what user_rules_bytes() needs to recompile an accepted rule."""
+    return (name, entry["pattern"], entry.get("replacement", "REDACTED"),
+            _flags(entry), _triggers(entry, binary=True))
+
+
+def _compile(name, entry, vetted):
+    pattern = entry.get("pattern")
+    if not isinstance(pattern, str) or not pattern:
+        raise ValueError("missing pattern")
+    try:
+        flags = _flags(entry)
+        regex = re.compile(pattern, flags)
+    except re.error as e:
+        raise ValueError(f"invalid pattern: {e}")
+
+    replacement = entry.get("replacement", "REDACTED")
+    try:
+        # Compiles the replacement template, catching bad group references
+        regex.sub(replacement, "")
+    except (re.error, TypeError) as e:
+        raise ValueError(f"invalid replacement: {e}")
+
+    triggers = _triggers(entry)
+
+    regex, replacement, used = engine.compile_rule(pattern, replacement, flags)
+    if used == "re2":
+        # Linear-time matching; nothing to probe
+        return name, regex, replacement, triggers
+
+    if NESTED_QUANTIFIER.search(pattern):
+        raise ValueError("nested quantifiers can backtrack catastrophically")
+    fingerprint = hashlib.sha256(f"growth {MAX_GROWTH}:{flags}:{pattern}".encode()).hexdigest()
+    if fingerprint not in vetted:
+        growth = probe(regex)
+        vetted[fingerprint] = "" if growth <= MAX_GROWTH else (
+            "search time on a pathological probe input grows like "
+            + ("an exponential" if growth == math.inf else f"length^{growth:.0f}"))
+    if vetted[fingerprint]:
+        raise ValueError(vetted[fingerprint])
+    return name, regex, replacement, triggers
+
+
+def probe_inputs(pattern):
+    """Yield (chars, size, text) inputs that tend to trigger backtracking in `pattern`.
+
+    Each kind of input, a run of `chars`, comes in every PROBE_SIZES size,
+    smallest first.
+    """
+    literals = {c for c in re.sub(r'\\.', '', pattern) if c.isalnum() or c in "_-./:@= "}
+    alphabet = sorted(literals | {"a", "0", " ", "_"})
+    for size in PROBE_SIZES:
+        for chars in alphabet + ["a0", "a ", "a_"]:
+            # Almost-matching run followed by a character that makes it fail
+            yield chars, size, (chars * size)[:size] + "\x00!"
+
+
+def probe(regex):
+    """Return how fast probe search time grows with the input length.
+
+    That is the highest power of the length seen between two sizes of one
+    kind of input, or infinity if even the smallest took PROBE_BUDGET.
+    Probing stops once it is over MAX_GROWTH.
+    """
+    last = {}  # chars -> (size, seconds) of the previous probe of that kind
+    growth = 0.0
+    for chars, size, text in probe_inputs(regex.pattern):
+        if chars in last and last[chars][1] > PROBE_BUDGET:
+            continue
+        seconds = _search_time(regex, text)
+        if chars not in last and seconds > PROBE_BUDGET:
+            return math.inf
+        if chars in last and seconds >= PROBE_FLOOR:
+            prev_size, prev = last[chars]
+            growth = max(growth, math.log(seconds / max(prev, PROBE_FLOOR / 100))
+                         / math.log(size / prev_size))
+            if growth > MAX_GROWTH:
+                break
+        last[chars] = size, seconds
+    return growth
+
+
+def _search_time(regex, text):
+    # Best of three while short enough for scheduling noise to matter
+    best = math.inf
+    for _ in range(3):
+        start = time.perf_counter()
+        regex.search(text)
+        best = min(best, time.perf_counter() - start)
+        if best >= PROBE_FLOOR * 10:
+            break
+    return best
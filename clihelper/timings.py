@@ -0,0 +1,61 @@
+"""Per-phase latency measurements for one clihelper run.
+
+`--timings` prints the breakdown to stderr; `--timings-file=PATH` (or
+CLIHELPER_TIMINGS_FILE) appends one JSON record per run for fleet-wide
+aggregation.
+"""
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+class Timings:
+    def __init__(self):
+        self.phases = {}  # name -> nanoseconds, in first-seen order
+        self.extra = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block and add it to phase `name`."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def add(self, name, ns):
+        self.phases[name] = self.phases.get(name, 0) + ns
+
+    def merge(self, phases):
+        """Add phases measured elsewhere (e.g. by the daemon)."""
+        for name, ns in phases.items():
+            self.add(name, ns)
+
+    def total_ns(self):
+        return sum(self.phases.values())
+
+    def report(self, file=sys.stderr):
+        """Print a per-phase breakdown in milliseconds."""
+        total = self.total_ns() or 1
+        print("\n[CLIHelper timings]", file=file)
+        for name, ns in self.phases.items():
+            print(f"  {name:<12} {ns / 1e6:>9.2f} ms  {100 * ns / total:>5.1f}%", file=file)
+        print(f"  {'total':<12} {self.total_ns() / 1e6:>9.2f} ms", file=file)
+        for name, value in self.extra.items():
+            if not isinstance(value, dict):
+                print(f"  {name:<12} {value}", file=file)
+
+    def record(self):
+        """Return this run as a JSON-serialisable dict."""
+        return {
+            "time": time.time(),
+            "phases_ms": {name: ns / 1e6 for name, ns in self.phases.items()},
+            "total_ms": self.total_ns() / 1e6,
+            **self.extra,
+        }
+
+    def append_json(self, path):
+        with open(path, "a") as f:
+            f.write(json.dumps(self.record()) + "\n")
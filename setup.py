@@ -25,6 +25,12 @@ setup(
     install_requires=[
         "anthropic>=0.18.0",
     ],
+    extras_require={
+        # Linear-time regex engine for redaction
+        "re2": ["google-re2"],
+        # Vectorized entropy scoring of large inputs
+        "numpy": ["numpy"],
+    },
     entry_points={
         "console_scripts": [
             "clihelper=clihelper.cli:main",
@@ -0,0 +1,154 @@
+import contextlib
+import json
+import os
+import time
+
+import pytest
+
+from clihelper import cache, cli
+
+
+def age(response_cache, key, seconds):
+    """Make `key` look last used `seconds` ago."""
+    path = response_cache.directory / f"{key}.json"
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    responses = cache.ResponseCache(tmp_path, max_entries=2)
+    responses.put("a", "answer a")
+    responses.put("b", "answer b")
+    age(responses, "a", 20)
+    age(responses, "b", 30)
+    assert responses.get("b") == "answer b"  # a hit makes b the most recent
+
+    responses.put("c", "answer c")
+
+    assert responses.get("a") is None
+    assert responses.get("b") == "answer b"
+    assert responses.get("c") == "answer c"
+
+
+def test_entries_over_the_byte_cap_are_evicted(tmp_path):
+    responses = cache.ResponseCache(tmp_path, max_bytes=200)  # one ~150-byte entry
+    responses.put("old", "x" * 100)
+    age(responses, "old", 10)
+
+    responses.put("new", "y" * 100)
+
+    assert responses.get("old") is None
+    assert responses.get("new") == "y" * 100
+
+
+def test_expired_entries_are_not_served(tmp_path):
+    responses = cache.ResponseCache(tmp_path, ttl=60)
+    responses.put("key", "answer")
+    path = tmp_path / "key.json"
+    path.write_text(json.dumps({"created": time.time() - 120, "response": "answer"}))
+
+    assert responses.get("key") is None
+    assert not path.exists()
+
+
+def test_expired_entries_are_dropped_on_put(tmp_path):
+    responses = cache.ResponseCache(tmp_path, ttl=60)
+    responses.put("stale", "answer")
+    age(responses, "stale", 120)
+
+    responses.put("fresh", "answer")
+
+    assert not (tmp_path / "stale.json").exists()
+    assert responses.get("fresh") == "answer"
+
+
+@pytest.fixture
+def helper(tmp_path, monkeypatch):
+    """A CLIHelper with its cache in tmp_path and an API that counts calls."""
+    monkeypatch.setattr(cli.CLIHelper, "get_or_setup_api_key", lambda self: "key")
+    monkeypatch.setattr(cli.CLIHelper, "ensure_prompt_command", lambda self: None)
+    helper = cli.CLIHelper()
+    helper.responses = cache.ResponseCache(tmp_path)
+    helper.api_calls = 0
+
+    class Stream:
+        text_stream = ["fresh ", "answer"]
+
+    class Messages:
+        @contextlib.contextmanager
+        def stream(self, **kwargs):
+            helper.api_calls += 1
+            yield Stream()
+
+    class Client:
+        messages = Messages()
+
+    helper.get_client = lambda: Client()
+    key = cache.cache_key("prompt", cli.MODEL, cli.MAX_TOKENS, cli.TEMPERATURE)
+    helper.responses.put(key, "cached answer")
+    helper.key = key
+    return helper
+
+
+def test_cache_use_serves_hits(helper):
+    assert helper.call_api("prompt") == "cached answer"
+    assert helper.api_calls == 0
+
+
+def test_refresh_skips_the_lookup_but_stores_the_answer(helper):
+    helper.cache_mode = "refresh"
+
+    assert helper.call_api("prompt") == "fresh answer"
+    assert helper.api_calls == 1
+    assert helper.responses.get(helper.key) == "fresh answer"
+
+
+def test_no_cache_neither_reads_nor_stores(helper):
+    helper.cache_mode = "off"
+
+    assert helper.call_api("prompt") == "fresh answer"
+    assert helper.api_calls == 1
+    assert helper.responses.get(helper.key) == "cached answer"
+
+
+def test_memo_keeps_the_most_recently_used_lines(tmp_path):
+    memo = cache.RedactionMemo(tmp_path / "memo.json", max_entries=2)
+    memo.put("a", "line a")
+    memo.put("b", "line b")
+    assert memo.get("a") == "line a"
+
+    memo.put("c", "line c")
+    memo.save()
+
+    reloaded = cache.RedactionMemo(tmp_path / "memo.json")
+    assert reloaded.get("b") is None
+    assert reloaded.get("a") == "line a"
+    assert reloaded.get("c") == "line c"
+
+
+def test_memo_is_not_hit_after_a_ruleset_change(helper, tmp_path, monkeypatch):
+    helper.redaction_memo = cache.RedactionMemo(tmp_path / "memo.json")
+    redacted = []
+
+    def redact_command(text):
+        redacted.append(text)
+        return f"redacted {text}", False
+
+    monkeypatch.setattr(helper, "_redact", redact_command)
+    commands = ["export TOKEN=abc", "ls"]
+
+    monkeypatch.setattr(cli.redact, "ruleset_version", lambda: "v1")
+    assert helper.redact_history(commands) == ["redacted export TOKEN=abc", "redacted ls"]
+    assert helper.redact_history(commands) == ["redacted export TOKEN=abc", "redacted ls"]
+    assert redacted == commands
+
+    monkeypatch.setattr(cli.redact, "ruleset_version", lambda: "v2")
+    helper.redact_history(commands)
+    assert redacted == commands * 2
+
+
+def test_ruleset_version_follows_the_rules(monkeypatch):
+    version = cli.redact.ruleset_version()
+    monkeypatch.setattr(cli.redact, "RULES", cli.redact.RULES[:-1])
+
+    assert cli.redact.ruleset_version() != version
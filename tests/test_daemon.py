@@ -0,0 +1,58 @@
+import socket
+import threading
+import time
+
+from clihelper import cli, daemon
+
+
+def test_silent_daemon_counts_as_not_running(tmp_path):
+    path = tmp_path / "daemon.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen()
+    accepted = []
+    threading.Thread(target=lambda: accepted.append(server.accept()), daemon=True).start()
+
+    start = time.monotonic()
+    assert daemon.request({"mode": "query"}, socket_path=path, timeout=0.2) is None
+    assert time.monotonic() - start < 5
+    server.close()
+
+
+def answer_in_process(monkeypatch, deltas):
+    class Helper:
+        def __init__(self, **kwargs):
+            pass
+
+        def analyze_direct_query(self, query, on_text):
+            for text in deltas:
+                on_text(text)
+            return "".join(deltas)
+
+    monkeypatch.setattr(cli, "CLIHelper", Helper)
+
+
+def test_fallback_does_not_repeat_streamed_text(monkeypatch):
+    def request(payload, on_text=None):
+        on_text("Use `git ")
+        on_text("stash`")
+        return None  # the daemon stopped mid-answer
+
+    monkeypatch.setattr(daemon, "request", request)
+    answer_in_process(monkeypatch, ["Use ", "`git stash`", " to save ", "changes."])
+    shown = []
+
+    cli.run(False, {"mode": "query", "query": "save work"}, shown.append)
+
+    assert "".join(shown) == "Use `git stash` to save changes."
+
+
+def test_fallback_restarts_a_different_answer(monkeypatch):
+    monkeypatch.setattr(daemon, "request",
+                        lambda payload, on_text=None: on_text("Run `ls") or None)
+    answer_in_process(monkeypatch, ["Run ", "`pwd`"])
+    shown = []
+
+    cli.run(False, {"mode": "query", "query": "where am I"}, shown.append)
+
+    assert "".join(shown) == "Run `ls\n\n[answer restarted]\nRun `pwd`"
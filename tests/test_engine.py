@@ -0,0 +1,83 @@
+import random
+import re
+
+import pytest
+
+from clihelper import engine, redact
+
+pytest.importorskip("re2")
+
+# User-rule style patterns using the classes RE2 spells differently
+EXTRA_PATTERNS = [
+    ("corp_token", r'corp_\w{8,}', 'corp_REDACTED'),
+    ("pin", r'(pin\s*=\s*)(\d+)', r'\1REDACTED'),
+    ("not_space", r'key\S{4}', 'key_REDACTED'),
+    ("spaced", r'user\s+(\W+)', r'user \1'),
+]
+
+PIECES = [
+    "password", "passwd", "pwd", "token", "api_key", "bearer", "sshpass -p", "://", ":",
+    "@", "=", "'", '"', "-", "corp_", "pin", "key", "user", "1234", "abcdEFGH5678ijkl",
+    "é", "ß", "ſ", "Ω", "٣", "日本", "_",
+]
+SPACES = [" ", "\t", "\n", "\v", "\f", "\r", "\x1c", "\x85", "\xa0", " ", " ",
+          " ", " ", "　"]
+
+
+def compile_both(monkeypatch, pattern, replacement, re2_pattern=None):
+    monkeypatch.setattr(engine, "ENGINE", "re")
+    with_re = engine.compile_rule(pattern, replacement, re.IGNORECASE)
+    monkeypatch.setattr(engine, "ENGINE", "re2")
+    with_re2 = engine.compile_rule(pattern, replacement, re.IGNORECASE, re2_pattern)
+    return with_re, with_re2
+
+
+def fuzz_texts(seed, count=3000):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(PIECES if rng.random() < 0.6 else SPACES)
+                      for _ in range(rng.randint(1, 12)))
+
+
+def rules(binary):
+    for name, pattern, replacement, _ in redact.RULES:
+        re2_pattern = redact.RE2_PATTERNS.get(name)
+        if binary:
+            yield (name, pattern.encode(), replacement.encode(),
+                   re2_pattern and re2_pattern.encode())
+        else:
+            yield name, pattern, replacement, re2_pattern
+    for name, pattern, replacement in EXTRA_PATTERNS:
+        if binary:
+            yield name, pattern.encode(), replacement.encode(), None
+        else:
+            yield name, pattern, replacement, None
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_engines_agree_on_unicode_whitespace(monkeypatch, binary):
+    for name, pattern, replacement, re2_pattern in rules(binary):
+        (re_regex, re_repl, _), (re2_regex, re2_repl, used) = compile_both(
+            monkeypatch, pattern, replacement, re2_pattern)
+        if used != "re2":
+            continue
+        for text in fuzz_texts(name):
+            if binary:
+                text = text.encode()
+            assert re2_regex.sub(re2_repl, text) == re_regex.sub(re_repl, text), (name, text)
+
+
+def test_unicode_word_boundary_stays_on_re(monkeypatch):
+    _, (_, _, used) = compile_both(monkeypatch, r'\bcard\b', 'REDACTED')
+    assert used == "re"
+    _, (_, _, used) = compile_both(monkeypatch, rb'\bcard\b', b'REDACTED')
+    assert used == "re2"
+
+
+@pytest.mark.parametrize("text", [
+    "sshpass -p\xa0hunter2",
+    "token: abcdefghijklmnopqrstuvwxyz",
+    "password =　hunter2",
+])
+def test_secret_after_unicode_space_is_redacted(text):
+    assert redact.redact(text).endswith("REDACTED")
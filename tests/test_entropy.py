@@ -0,0 +1,54 @@
+import random
+import string
+
+import pytest
+
+from clihelper import entropy
+
+KEY = "aB3dE5fG7hJ9kL1mN3pQ5rS7tU"
+
+
+@pytest.mark.parametrize("text", [
+    "commit 3f786850e387550fdab836ed7e6dc881de23001b",
+    "image sha256:e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+    "request 123e4567-e89b-12d3-a456-426614174000 done",
+    "class AbstractSingletonProxyFactoryBean2 extends Base",
+    "/usr/lib/python3.11/site-packages/setuptools/command",
+    "2024-01-15T10:30:00.000000Z 1234567890123456789012",
+])
+def test_ordinary_tokens_are_kept(text):
+    assert entropy.mask_secrets(text) == (text, 0)
+
+
+@pytest.mark.parametrize("text, masked", [
+    (f"deploy --key {KEY}", "deploy --key REDACTED"),
+    (f"export X={KEY}", "export X=REDACTED"),
+    ("token: 3f786850e387550fdab836ed7e6dc881de23001b", "token: REDACTED"),
+    (f"/home/user/.cache/pip/wheels/ab/cd/{KEY}/pkg.whl",
+     "/home/user/.cache/pip/wheels/ab/cd/REDACTED/pkg.whl"),
+    (f"wJalrXUtnFEMI/K7MDENG/{KEY}", "REDACTED"),
+])
+def test_secrets_are_masked(text, masked):
+    assert entropy.mask_secrets(text) == (masked, 1)
+    assert entropy.mask_secrets(text.encode()) == (masked.encode(), 1)
+
+
+def random_tokens(seed, count):
+    rng = random.Random(seed)
+    alphabets = [string.ascii_letters + string.digits, string.hexdigits.lower(),
+                 string.ascii_lowercase + string.digits, string.ascii_letters + "0123456789+/_-",
+                 "ab01", string.ascii_uppercase + "2"]
+    for _ in range(count):
+        alphabet = rng.choice(alphabets)
+        yield "".join(rng.choice(alphabet) for _ in range(rng.randint(20, 80))).encode()
+
+
+def test_numpy_scoring_matches_pure_python():
+    np = pytest.importorskip("numpy")
+    tokens = list(random_tokens("score", 5000))
+    tokens += [b"AbstractSingletonProxyFactoryBean2", b"3f786850e387550fdab836ed7e6dc881de23001b"]
+
+    verdicts = entropy._score_numpy(np, tokens).tolist()
+
+    assert verdicts == [entropy._score_one(token) for token in tokens]
+    assert {entropy.KEEP, entropy.MASK, entropy.MASK_IN_CONTEXT} <= set(verdicts)
@@ -0,0 +1,143 @@
+from clihelper import history
+
+
+def test_tail_stops_in_history_from_before_timestamps(tmp_path, monkeypatch):
+    # HISTTIMEFORMAT was just turned on: two timestamped entries after a long
+    # plain one-command-per-line history
+    path = tmp_path / "bash_history"
+    path.write_text("".join(f"make target{i}\n" for i in range(100000))
+                    + "#1700000000\ngit status\n#1700000060\ngit push\n")
+    read = []
+
+    def reverse_lines(f):
+        for line in original(f):
+            read.append(line)
+            yield line
+
+    original = history.reverse_lines
+    monkeypatch.setattr(history, "reverse_lines", reverse_lines)
+
+    assert [e.command for e in history.tail_entries(path, 5)] == [
+        "make target99997", "make target99998", "make target99999", "git status", "git push"]
+    assert len(read) <= 5 + history.MAX_ENTRY_LINES + 5
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data if isinstance(data, bytes) else data.encode())
+    return path
+
+
+def test_bash_timestamped_multiline_entries(tmp_path):
+    path = write(tmp_path, "bash_history",
+                 "#1700000000\nfor f in *; do\n  echo $f\ndone\n#1700000060\ngit push")
+
+    assert history.tail_entries(path, 5) == [
+        history.HistoryEntry("for f in *; do\n  echo $f\ndone", 1700000000),
+        history.HistoryEntry("git push", 1700000060),
+    ]
+    # The unterminated last line is left for the next read
+    entries, end = history.read_entries(path)
+    assert entries == [history.HistoryEntry("for f in *; do\n  echo $f\ndone", 1700000000)]
+    assert end == len(path.read_bytes()) - len("git push")
+
+
+ZSH = (b": 1700000000:0;ls\n"
+       b": 1700000030:2;echo one\\\ntwo\n"
+       b": 1700000060:1;echo \xe6\x83\xb7\xa5\n")  # "日" metafied: 0x97 -> 0x83 0xb7
+
+
+def test_unmetafy():
+    assert history.unmetafy(b"echo \xe6\x83\xb7\xa5").decode() == "echo 日"
+    assert history.unmetafy(b"plain") == b"plain"
+
+
+def test_zsh_extended_history(tmp_path):
+    path = write(tmp_path, "zsh_history", ZSH)
+    expected = [
+        history.HistoryEntry("ls", 1700000000, 0),
+        history.HistoryEntry("echo one\ntwo", 1700000030, 2),
+        history.HistoryEntry("echo 日", 1700000060, 1),
+    ]
+
+    assert history.zsh_tail_entries(path, 5) == expected
+    assert history.zsh_tail_entries(path, 2) == expected[1:]
+    assert history.zsh_read_entries(path) == (expected, len(ZSH))
+
+
+def test_zsh_plain_history_and_unfinished_continuation(tmp_path):
+    path = write(tmp_path, "zsh_history", "ls\necho one\\\ntwo\n")
+    assert history.zsh_tail_entries(path, 5) == [
+        history.HistoryEntry("ls", None), history.HistoryEntry("echo one\ntwo", None)]
+
+    path.write_text("ls\necho one\\\ntwo\nfor x in a\\\n")
+    # The entry still being continued is left for the next read
+    assert history.zsh_read_entries(path) == (
+        [history.HistoryEntry("ls", None), history.HistoryEntry("echo one\ntwo", None)],
+        len("ls\necho one\\\ntwo\n"))
+
+
+FISH = ("- cmd: ls\n"
+        "  when: 1700000000\n"
+        "- cmd: echo a\\nb \\\\n\n"
+        "  when: 1700000030\n"
+        "  paths:\n"
+        "    - b\n"
+        "- cmd: pwd\n"
+        "  when: 1700000060")
+
+
+def test_fish_history(tmp_path):
+    path = write(tmp_path, "fish_history", FISH)
+    expected = [
+        history.HistoryEntry("ls", 1700000000),
+        history.HistoryEntry("echo a\nb \\n", 1700000030),
+        history.HistoryEntry("pwd", 1700000060),
+    ]
+
+    assert history.fish_tail_entries(path, 5) == expected
+    assert history.fish_tail_entries(path, 1) == expected[2:]
+    # Without its trailing newline the last "when:" isn't read yet
+    entries, end = history.fish_read_entries(path)
+    assert entries == expected[:2] + [history.HistoryEntry("pwd", None)]
+    assert end == FISH.rfind("\n") + 1
+
+
+def test_window_stops_at_first_older_entry(tmp_path):
+    # An entry back in the window further up must not be reached
+    backends = [
+        (history.BashHistory, "#1700000500\nold\n#1700000000\nls\n#1700000200\npwd\n"),
+        (history.ZshHistory, ": 1700000500:0;old\n: 1700000000:0;ls\n: 1700000200:0;pwd\n"),
+        (history.FishHistory, "- cmd: old\n  when: 1700000500\n- cmd: ls\n  when: 1700000000\n"
+                              "- cmd: pwd\n  when: 1700000200\n"),
+    ]
+    for backend, data in backends:
+        source = backend(write(tmp_path, backend.shell, data))
+        assert source.tail(10, since=1700000100) == [
+            history.HistoryEntry("pwd", 1700000200, *(0,) * (backend.shell == "zsh"))]
+        assert [e.command for e in source.tail(10, since=1600000000)] == ["old", "ls", "pwd"]
+
+
+def test_window_needs_timestamps(tmp_path):
+    path = write(tmp_path, "bash_history", "ls\npwd\n")
+    assert history.BashHistory(path).tail(10, since=0) == []
+    assert history.ZshHistory(path).tail(10, since=0) == []
+
+
+def test_detect(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("ZDOTDIR", raising=False)
+    monkeypatch.delenv("XDG_DATA_HOME", raising=False)
+
+    def detect(**environ):
+        source = history.detect(environ)
+        return source.shell, source.path
+
+    assert detect() == ("bash", tmp_path / ".bash_history")
+    assert detect(SHELL="/bin/tcsh") == ("bash", tmp_path / ".bash_history")
+    assert detect(SHELL="/usr/bin/zsh") == ("zsh", tmp_path / ".zsh_history")
+    assert detect(SHELL="/usr/bin/zsh", HISTFILE="~/hist") == ("zsh", tmp_path / "hist")
+    assert detect(SHELL="/bin/bash", HISTFILE="/tmp/h") == ("bash", history.Path("/tmp/h"))
+    # fish ignores $HISTFILE
+    assert detect(SHELL="/usr/local/bin/fish", HISTFILE="/tmp/h") == (
+        "fish", tmp_path / ".local" / "share" / "fish" / "fish_history")
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Without the SDK installed, its absence below would prove nothing
+pytest.importorskip("anthropic")
+
+HEAVY = ("anthropic", "httpx")
+
+
+def imported_modules(code, stdin=None):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], stdin=stdin,
+                            capture_output=True, text=True, check=True)
+    # "import time:   self [us] | cumulative | imported package"
+    return result.stdout, {line.rsplit("|", 1)[-1].strip()
+                           for line in result.stderr.splitlines()
+                           if line.startswith("import time:")}
+
+
+def heavy_modules(modules):
+    return sorted(m for m in modules if m.split(".")[0] in HEAVY)
+
+
+def assert_nothing_heavy(modules):
+    assert "clihelper.cli" in modules
+    assert heavy_modules(modules) == []
+
+
+def test_client_path_imports_the_sdk():
+    # The control: what the other tests look for does show up when used
+    _, modules = imported_modules(
+        "from clihelper.cli import CLIHelper\n"
+        "from clihelper.timings import Timings\n"
+        "helper = CLIHelper.__new__(CLIHelper)\n"
+        "helper._client, helper.api_key, helper.timings = None, 'key', Timings()\n"
+        "helper.get_client()")
+    assert {"anthropic", "httpx"} <= set(heavy_modules(modules))
+
+
+def test_importing_cli_skips_the_sdk():
+    assert_nothing_heavy(imported_modules("import clihelper.cli")[1])
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pty")
+def test_usage_skips_the_sdk():
+    # Usage is printed only when stdin is a terminal and there are no arguments
+    primary, secondary = os.openpty()
+    try:
+        # As the console script runs it
+        output, modules = imported_modules("from clihelper import main; main()",
+                                           stdin=secondary)
+    finally:
+        os.close(primary)
+        os.close(secondary)
+
+    assert "Usage:" in output
+    assert_nothing_heavy(modules)
@@ -0,0 +1,116 @@
+import pytest
+
+from clihelper import cli, history, index
+
+
+def write_history(path, commands, start=0):
+    path.write_text("".join(f"#{1700000000 + start + i}\n{c}\n" for i, c in enumerate(commands)))
+
+
+@pytest.fixture
+def history_index(tmp_path):
+    return index.HistoryIndex(history.BashHistory(tmp_path / "bash_history"),
+                              path=tmp_path / "history.db")
+
+
+def sync(history_index, **kwargs):
+    redacted = []
+
+    def redact_commands(commands):
+        redacted.extend(commands)
+        return commands
+
+    return history_index.sync(redact_commands, "v1", **kwargs), redacted
+
+
+def test_front_trimmed_history_is_indexed_incrementally(history_index):
+    commands = [f"make target{i}" for i in range(100)]
+    write_history(history_index.history_path, commands)
+    assert sync(history_index)[0] == 100
+
+    # bash dropping the oldest entries to HISTFILESIZE while appending new ones
+    write_history(history_index.history_path, commands[30:] + ["docker compose up"], start=30)
+    added, redacted = sync(history_index)
+
+    assert (added, redacted) == (1, ["docker compose up"])
+    assert [e.command for e in history_index.find("docker")] == ["docker compose up"]
+    assert sync(history_index)[0] == 0
+
+
+def test_rewritten_history_is_rebuilt(history_index):
+    write_history(history_index.history_path, [f"make target{i}" for i in range(100)])
+    sync(history_index)
+
+    write_history(history_index.history_path, ["git status", "git push"])
+
+    assert sync(history_index) == (2, ["git status", "git push"])
+    assert history_index.find("make") == []
+
+
+def test_limited_sync_leaves_large_builds_alone(history_index):
+    write_history(history_index.history_path, [f"make target{i}" for i in range(100)])
+
+    with pytest.raises(index.NotReady):
+        sync(history_index, limit=1024)
+    assert history_index.find("make") == []
+
+    assert sync(history_index)[0] == 100
+    write_history(history_index.history_path, [f"make target{i}" for i in range(101)])
+    assert sync(history_index, limit=1024)[0] == 1
+
+
+def test_window_returns_each_command_once_with_its_latest_run(history_index):
+    write_history(history_index.history_path,
+                  ["make", "git status", "make", "git push", "ls", "make"])
+    sync(history_index)
+
+    assert history_index.window(1700000001, 1700000004) == [
+        history.HistoryEntry("git status", 1700000001),
+        history.HistoryEntry("make", 1700000002),
+        history.HistoryEntry("git push", 1700000003),
+        history.HistoryEntry("ls", 1700000004)]
+    assert [e.command for e in history_index.window(1700000000, 1700000005, limit=2)] == [
+        "ls", "make"]
+    assert history_index.window(1800000000, 1800000300) == []
+
+
+def test_prefix_returns_most_recently_run_first(history_index):
+    write_history(history_index.history_path,
+                  ["git push", "git status", "gitk", "ls", "git push origin main", "git status"])
+    sync(history_index)
+
+    assert [e.command for e in history_index.prefix("git ")] == [
+        "git status", "git push origin main", "git push"]
+    assert [e.command for e in history_index.prefix("git push", limit=1)] == [
+        "git push origin main"]
+    assert [e.command for e in history_index.recent(2)] == ["git push origin main", "git status"]
+
+
+def test_unchanged_history_is_not_read(history_index, monkeypatch):
+    write_history(history_index.history_path, ["git status", "git push"])
+    sync(history_index)
+
+    def read(*args):
+        raise AssertionError("history file read")
+
+    monkeypatch.setattr(history_index, "_resume_offset", read)
+    monkeypatch.setattr(history_index.source, "read", read)
+    assert sync(history_index) == (0, [])
+
+
+def test_recent_history_comes_from_the_synced_index(history_index, monkeypatch):
+    write_history(history_index.history_path, ["make", "git status", "make", "git push"])
+    sync(history_index)
+    monkeypatch.setattr(cli.CLIHelper, "get_or_setup_api_key", lambda self: "key")
+    monkeypatch.setattr(cli.CLIHelper, "ensure_prompt_command", lambda self: None)
+    helper = cli.CLIHelper()
+
+    def read(*args, **kwargs):
+        raise AssertionError("history file read")
+
+    monkeypatch.setattr(helper, "redact_history", read)
+    monkeypatch.setattr(history_index.source, "tail", read)
+    monkeypatch.setattr(cli.time, "time", lambda: 1700000002 + cli.HISTORY_WINDOW)
+
+    assert helper.recent_history(history_index.source, history_index=history_index) == [
+        "make", "git push"]
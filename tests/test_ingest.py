@@ -0,0 +1,21 @@
+import io
+
+import pytest
+
+from clihelper import ingest, redact
+
+
+@pytest.mark.parametrize("chunk_size", [ingest.CHUNK_SIZE, 1000])
+@pytest.mark.parametrize("data, kept", [
+    # The rest of the line is cut off from its key
+    (b"log: " + b"x" * 65519 + b" password=hu" + b"nter2-prod-db-Pw\nnext line\n", b"log: "),
+    # What is left before the cut is too short for the rule
+    (b"x" * 4080 + b" api_key=ghp_Ab3De5fG7hJ9kL1mN3pQ5rS7tU\nnext line\n", b"x" * 4080 + b" "),
+])
+def test_rest_of_overlong_line_is_dropped(chunk_size, data, kept):
+    capture = ingest.StdinCapture().read(io.BytesIO(data), chunk_size)
+    out = redact.redact(capture.render())
+
+    assert b"nter2" not in out and b"ghp_" not in out
+    assert out == kept + b"\nnext line"
+    assert capture.total_lines == 2
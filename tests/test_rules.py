@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from clihelper import engine, rules
+
+
+@pytest.fixture(autouse=True)
+def vetted_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(rules, "VETTED_FILE", tmp_path / "vetted.json")
+
+
+def load(tmp_path, **entry):
+    entry.setdefault("pattern", "corp_[a-z0-9]{8}")
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([dict(name="corp", **entry)]))
+    return rules.load_rules(path)
+
+
+def test_triggers_are_case_folded(tmp_path):
+    [(name, _, _, triggers)] = load(tmp_path, triggers=["CORP_", "ſecret"])
+    assert (name, triggers) == ("corp", ("corp_", "secret"))
+
+
+@pytest.mark.parametrize("triggers", [5, "corp_", [], [""], ["corp_", 5]])
+def test_malformed_triggers_reject_the_rule(tmp_path, capsys, triggers):
+    assert load(tmp_path, triggers=triggers) == []
+    assert "Skipping redaction rule 'corp': triggers must be" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("pattern", [
+    r"[a-z0-9-]+\.corp\.example\.com",  # quadratic scans, but no blowup
+    r"[\w.-]+@corp\.com",
+    r"corp_[a-z0-9]{8}",
+])
+def test_polynomial_rules_are_accepted(tmp_path, monkeypatch, pattern):
+    monkeypatch.setattr(engine, "ENGINE", "re")
+    assert [name for name, *_ in load(tmp_path, pattern=pattern)] == ["corp"]
+
+
+def test_exponential_rules_are_rejected_and_remembered(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(engine, "ENGINE", "re")
+    assert load(tmp_path, pattern="(a|aa)+b") == []
+    assert "grows like" in capsys.readouterr().err
+    assert len(load(tmp_path)) == 1
+
+    def probe(regex):
+        raise AssertionError("probed again")
+
+    monkeypatch.setattr(rules, "probe", probe)
+    assert load(tmp_path, pattern="(a|aa)+b") == []
+    assert "grows like" in capsys.readouterr().err
+    assert len(load(tmp_path)) == 1